@@ -26,8 +26,8 @@
 from PyInstaller.archive.writers import CArchiveWriter, ZlibArchiveWriter
 from PyInstaller.building.datastruct import Target, _check_guts_eq, normalize_pyz_toc, normalize_toc
 from PyInstaller.building.utils import (
-    _check_guts_toc, _make_clean_directory, _rmtree, process_collected_binary, get_code_object, strip_paths_in_code,
-    compile_pymodule
+    _check_guts_toc, _make_clean_directory, _rmtree, process_collected_binaries, get_code_object, strip_paths_in_code,
+    compile_pymodules
 )
 from PyInstaller.building.splash import Splash  # argument type validation in EXE
 from PyInstaller.compat import is_cygwin, is_darwin, is_linux, is_win, strict_collect_mode
@@ -79,14 +79,19 @@ def __init__(self, *tocs, **kwargs):
         bootstrap_dependencies = get_bootstrap_modules()
 
         # Compile the python modules that are part of bootstrap dependencies, so that they can be collected into the
-        # CArchive/PKG and imported by the bootstrap script.
-        self.dependencies = []
+        # CArchive/PKG and imported by the bootstrap script. The pymodule entries are picked out first, and compiled
+        # in a single batch.
         workpath = os.path.join(CONF['workpath'], 'localpycs')
+        pymodule_entries = [(name, src_path) for name, src_path, typecode in bootstrap_dependencies
+                            if typecode == 'PYMODULE']
+        pyc_files = compile_pymodules(pymodule_entries, workpath, code_cache=None)
+        pyc_paths = {name: pyc_path for (name, _), pyc_path in zip(pymodule_entries, pyc_files)}
+
+        self.dependencies = []
         for name, src_path, typecode in bootstrap_dependencies:
             if typecode == 'PYMODULE':
-                # Compile pymodule and include the compiled .pyc file.
-                pyc_path = compile_pymodule(name, src_path, workpath, code_cache=None)
-                self.dependencies.append((name, pyc_path, typecode))
+                # Include the compiled .pyc file.
+                self.dependencies.append((name, pyc_paths[name], typecode))
             else:
                 # Include as is (extensions).
                 self.dependencies.append((name, src_path, typecode))
@@ -258,6 +263,21 @@ def assemble(self):
         bootstrap_toc = []  # TOC containing bootstrap scripts and modules, which must not be sorted.
         archive_toc = []  # TOC containing all other elements. Sorted to enable reproducible builds.
 
+        # In onefile mode, process the binaries (both EXTENSION and BINARY entries) ahead of the main loop, so that they
+        # can be processed in parallel.
+        processed_binaries = {}
+        if not self.exclude_binaries:
+            processed_binaries = process_collected_binaries(
+                [(dest_name, src_name, typecode) for dest_name, src_name, typecode in self.toc
+                 if typecode in ('BINARY', 'EXTENSION') and os.path.exists(src_name)],
+                use_strip=self.strip_binaries,
+                use_upx=self.upx_binaries,
+                upx_exclude=self.upx_exclude,
+                target_arch=self.target_arch,
+                codesign_identity=self.codesign_identity,
+                entitlements_file=self.entitlements_file,
+            )
+
         for dest_name, src_name, typecode in self.toc:
             # Ensure that the source file exists, if necessary. Skip the check for OPTION entries, where 'src_name' is
             # None. Also skip DEPENDENCY entries due to special contents of 'dest_name' and/or 'src_name'. Same for the
@@ -284,19 +304,9 @@ def assemble(self):
                     # container's TOC de-duplication should take care of them (same as with EXTENSION ones, really).
                     self.dependencies.append((dest_name, src_name, typecode))
                 else:
-                    # This is onefile-specific codepath. The binaries (both EXTENSION and BINARY entries) need to be
-                    # processed using `process_collected_binary` helper.
-                    src_name = process_collected_binary(
-                        src_name,
-                        dest_name,
-                        use_strip=self.strip_binaries,
-                        use_upx=self.upx_binaries,
-                        upx_exclude=self.upx_exclude,
-                        target_arch=self.target_arch,
-                        codesign_identity=self.codesign_identity,
-                        entitlements_file=self.entitlements_file,
-                        strict_arch_validation=(typecode == 'EXTENSION'),
-                    )
+                    # This is onefile-specific codepath. The binaries (both EXTENSION and BINARY entries) have been
+                    # processed using `process_collected_binaries` helper above.
+                    src_name = processed_binaries[(dest_name, src_name, typecode)]
                     archive_toc.append((dest_name, src_name, self.cdict.get(typecode, False), self.xformdict[typecode]))
             elif typecode in ('DATA', 'ZIPFILE'):
                 # Same logic as above for BINARY and EXTENSION; if `exclude_binaries` is set, we are in onedir mode;
@@ -1103,6 +1113,7 @@ def _check_guts(self, data, last_build):
     def assemble(self):
         _make_clean_directory(self.name)
         logger.info("Building COLLECT %s", self.tocbasename)
+        collect_toc = []
         for dest_name, src_name, typecode in self.toc:
             # Ensure that the source file exists, if necessary. Skip the check for DEPENDENCY entries due to special
             # contents of 'dest_name' and/or 'src_name'. Same for the SYMLINK entries, where 'src_name' is relative
@@ -1121,6 +1132,20 @@ def assemble(self):
                 raise SystemExit(
                     'Security-Alert: attempting to store file outside of the dist directory: %r. Aborting.' % dest_name
                 )
+            collect_toc.append((dest_name, src_name, typecode))
+
+        # Process the binaries ahead of collection, so that they can be processed in parallel.
+        processed_binaries = process_collected_binaries(
+            [toc_entry for toc_entry in collect_toc if toc_entry[2] in ('EXTENSION', 'BINARY')],
+            use_strip=self.strip_binaries,
+            use_upx=self.upx_binaries,
+            upx_exclude=self.upx_exclude,
+            target_arch=self.target_arch,
+            codesign_identity=self.codesign_identity,
+            entitlements_file=self.entitlements_file,
+        )
+
+        for dest_name, src_name, typecode in collect_toc:
             # Create parent directory structure, if necessary
             if typecode in ("EXECUTABLE", "PKG"):
                 dest_path = os.path.join(self.name, dest_name)
@@ -1135,17 +1160,7 @@ def assemble(self):
                     "but there already exists a file at that path!"
                 )
             if typecode in ('EXTENSION', 'BINARY'):
-                src_name = process_collected_binary(
-                    src_name,
-                    dest_name,
-                    use_strip=self.strip_binaries,
-                    use_upx=self.upx_binaries,
-                    upx_exclude=self.upx_exclude,
-                    target_arch=self.target_arch,
-                    codesign_identity=self.codesign_identity,
-                    entitlements_file=self.entitlements_file,
-                    strict_arch_validation=(typecode == 'EXTENSION'),
-                )
+                src_name = processed_binaries[(dest_name, src_name, typecode)]
             if typecode == 'SYMLINK':
                 os.symlink(src_name, dest_path)  # Create link at dest_path, pointing at (relative) src_name
             elif typecode != 'DEPENDENCY':
@@ -32,8 +32,8 @@
 from PyInstaller.building.osx import BUNDLE
 from PyInstaller.building.splash import Splash
 from PyInstaller.building.utils import (
-    _check_guts_toc, _check_guts_toc_mtime, _should_include_system_binary, format_binaries_and_datas, compile_pymodule,
-    add_suffix_to_extension, postprocess_binaries_toc_pywin32, postprocess_binaries_toc_pywin32_anaconda
+    _check_guts_toc, _check_guts_toc_mtime, _should_include_system_binary, format_binaries_and_datas, compile_pymodules,
+    add_suffix_to_extension, postprocess_binaries_toc_pywin32
 )
 from PyInstaller.compat import is_win, is_conda, is_darwin
 from PyInstaller.depend import bindepend
@@ -736,6 +736,7 @@ def assemble(self):
 
         pycs_dir = os.path.join(CONF['workpath'], 'localpycs')
         code_cache = self.graph.get_code_objects()
+        pyc_entries = []
 
         for name, src_path, typecode in pure_pymodules_toc:
             assert typecode == 'PYMODULE'
@@ -772,10 +773,14 @@ def assemble(self):
                 # need to use the .pyc extension.
                 dest_path += '.pyc'
 
-                # Compile
-                obj_path = compile_pymodule(name, src_path, workpath=pycs_dir, code_cache=code_cache)
+                pyc_entries.append((name, src_path, dest_path))
 
-                self.datas.append((dest_path, obj_path, "DATA"))
+        # Compile the modules that are to be collected as external .pyc files, and collect them as data files.
+        obj_paths = compile_pymodules([(name, src_path) for name, src_path, _ in pyc_entries],
+                                      workpath=pycs_dir,
+                                      code_cache=code_cache)
+        for (_, _, dest_path), obj_path in zip(pyc_entries, obj_paths):
+            self.datas.append((dest_path, obj_path, "DATA"))
 
         # Normalize list of pure-python modules (these will end up in PYZ archive, so use specific normalization).
         self.pure = normalize_pyz_toc(self.pure)
@@ -805,10 +810,8 @@ def assemble(self):
 
         # Apply work-around for (potential) binaries collected from `pywin32` package...
         if is_win:
-            self.binaries = postprocess_binaries_toc_pywin32(self.binaries)
-            # With anaconda, we need additional work-around...
-            if is_conda:
-                self.binaries = postprocess_binaries_toc_pywin32_anaconda(self.binaries)
+            # With anaconda, we need additional work-around, which is applied in the same pass.
+            self.binaries = postprocess_binaries_toc_pywin32(self.binaries, anaconda=is_conda)
 
         # Final normalization of `datas` and `binaries`:
         #  - normalize both TOCs together (to avoid having duplicates across the lists)
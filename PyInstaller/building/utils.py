@@ -9,18 +9,24 @@
 # SPDX-License-Identifier: (GPL-2.0-or-later WITH Bootloader-exception)
 #-----------------------------------------------------------------------------
 
+import concurrent.futures
 import fnmatch
+import functools
 import glob
 import hashlib
+import importlib.util
+import json
 import marshal
 import os
 import pathlib
 import platform
-import py_compile
+import re
 import shutil
 import struct
 import subprocess
 import sys
+import threading
+import time
 import zipfile
 
 from PyInstaller import compat
@@ -60,13 +66,43 @@ def _check_guts_toc_mtime(attr_name, old_toc, new_toc, last_build):
 
     Use this for calculated/analysed values read from cache.
     """
+    get_mtime = _make_scandir_mtime_getter() if is_win else misc.mtime
     for dest_name, src_name, typecode in old_toc:
-        if misc.mtime(src_name) > last_build:
+        if get_mtime(src_name) > last_build:
             logger.info("Building because %s changed", src_name)
             return True
     return False
 
 
+def _make_scandir_mtime_getter():
+    """
+    Return a function that behaves like `misc.mtime`, but obtains the modification times from `os.scandir()` of the
+    file's parent directory, which is performed only once per directory. Intended for use on Windows, where
+    `os.scandir()` provides stat information for directory entries at no additional cost, while each `os.stat()` call
+    needs to open the file.
+    """
+    dir_mtimes = {}
+
+    def _get_mtime(filename):
+        try:
+            dirname, basename = os.path.split(os.path.normcase(filename))
+            mtimes = dir_mtimes.get(dirname)
+            if mtimes is None:
+                mtimes = dir_mtimes[dirname] = {}
+                with os.scandir(dirname or os.curdir) as entries:
+                    for entry in entries:
+                        try:
+                            mtimes[os.path.normcase(entry.name)] = int(entry.stat().st_mtime)
+                        except OSError:
+                            pass
+            return mtimes[basename]
+        except Exception:
+            # Fall back to `misc.mtime`, which also takes care of invalid and non-existent files.
+            return misc.mtime(filename)
+
+    return _get_mtime
+
+
 def _check_guts_toc(attr_name, old_toc, new_toc, last_build):
     """
     Rebuild is required if either TOC content changed or mtimes of files listed in old TOC are newer than last_build.
@@ -77,6 +113,10 @@ def _check_guts_toc(attr_name, old_toc, new_toc, last_build):
         _check_guts_toc_mtime(attr_name, old_toc, new_toc, last_build)
 
 
+# Set of extension module suffixes, for fast membership tests in `add_suffix_to_extension`.
+_EXTENSION_SUFFIXES_SET = frozenset(EXTENSION_SUFFIXES)
+
+
 def add_suffix_to_extension(dest_name, src_name, typecode):
     """
     Take a TOC entry (dest_name, src_name, typecode) and adjust the dest_name for EXTENSION to include the full library
@@ -93,7 +133,7 @@ def add_suffix_to_extension(dest_name, src_name, typecode):
     # Change the dotted name into a relative path. This places C extensions in the Python-standard location.
     dest_name = dest_name.replace('.', os.sep)
     # In some rare cases extension might already contain a suffix. Skip it in this case.
-    if os.path.splitext(dest_name)[1] not in EXTENSION_SUFFIXES:
+    if os.path.splitext(dest_name)[1] not in _EXTENSION_SUFFIXES_SET:
         # Determine the base name of the file.
         base_name = os.path.basename(dest_name)
         assert '.' not in base_name
@@ -122,105 +162,280 @@ def process_collected_binary(
 
     In addition to given arguments, this function also uses CONF['cachedir'] and CONF['upx_dir'].
     """
-    from PyInstaller.config import CONF
+    return _process_collected_binaries(
+        [(src_name, dest_name, strict_arch_validation)],
+        use_strip=use_strip,
+        use_upx=use_upx,
+        upx_exclude=upx_exclude,
+        target_arch=target_arch,
+        codesign_identity=codesign_identity,
+        entitlements_file=entitlements_file,
+    )[0]
+
+
+def process_collected_binaries(
+    binaries_toc,
+    use_strip=False,
+    use_upx=False,
+    upx_exclude=None,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+):
+    """
+    Process the given TOC list of collected binaries (BINARY and EXTENSION entries) in the same way as
+    `process_collected_binary`, but in batch: the per-file work (hashing, copying, platform-specific processing) is
+    performed in parallel using a thread pool, and strip and UPX are invoked once for multiple files.
 
+    Return a dictionary that maps the given TOC entries to the names of processed files.
+    """
+    # Entries with the same (case-normalized) destination name end up in the same file in the cache, so they must not
+    # be processed within the same batch. Split the entries into rounds, where N-th round contains N-th occurrence of
+    # each destination name; normally, all entries end up in the first round.
+    rounds = []
+    occurrences = {}
+    for toc_entry in dict.fromkeys(binaries_toc):
+        cached_id = os.path.normcase(toc_entry[0])
+        occurrence = occurrences.get(cached_id, 0)
+        occurrences[cached_id] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(toc_entry)
+
+    processed_binaries = {}
+    for round_toc in rounds:
+        processed_names = _process_collected_binaries(
+            [(src_name, dest_name, typecode == 'EXTENSION') for dest_name, src_name, typecode in round_toc],
+            use_strip=use_strip,
+            use_upx=use_upx,
+            upx_exclude=upx_exclude,
+            target_arch=target_arch,
+            codesign_identity=codesign_identity,
+            entitlements_file=entitlements_file,
+        )
+        processed_binaries.update(zip(round_toc, processed_names))
+
+    return processed_binaries
+
+
+def _process_collected_binaries(
+    binaries,
+    use_strip=False,
+    use_upx=False,
+    upx_exclude=None,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+):
+    """
+    Implementation of `process_collected_binary` and `process_collected_binaries`. The `binaries` is a list of
+    (src_name, dest_name, strict_arch_validation) tuples; destination names must be unique. Return the list of names of
+    processed files.
+    """
     # We need to use cache in the following scenarios:
     #  * extra binary processing due to use of `strip` or `upx`
     #  * building on macOS, where we need to rewrite library paths in binaries' headers and (re-)sign the binaries.
     if not use_strip and not use_upx and not is_darwin:
-        return src_name
-
-    # Skip processing if this is Windows .manifest file. We used to process these as part of support for collecting
-    # WinSxS assemblies, but that was removed in PyInstaller 6.0. So in case we happen to get a .manifest file here,
-    # return it as-is.
-    if is_win and src_name.lower().endswith(".manifest"):
-        return src_name
-
-    # Match against provided UPX exclude patterns.
-    upx_exclude = upx_exclude or []
-    if use_upx:
-        src_path = pathlib.PurePath(src_name)
-        for upx_exclude_entry in upx_exclude:
-            # pathlib.PurePath.match() matches from right to left, and supports * wildcard, but does not support the
-            # "**" syntax for directory recursion. Case sensitivity follows the OS default.
-            if src_path.match(upx_exclude_entry):
+        return [src_name for src_name, dest_name, strict_arch_validation in binaries]
+
+    processed_names = [None] * len(binaries)
+
+    # Pre-compiled UPX exclude patterns; skip matching altogether if UPX is not used or there are no patterns.
+    upx_exclude_patterns = _compile_upx_exclude_patterns(tuple(upx_exclude)) if use_upx and upx_exclude else None
+    indices_by_upx = {False: [], True: []}
+
+    for index, (src_name, dest_name, strict_arch_validation) in enumerate(binaries):
+        # Skip processing if this is Windows .manifest file. We used to process these as part of support for collecting
+        # WinSxS assemblies, but that was removed in PyInstaller 6.0. So in case we happen to get a .manifest file
+        # here, return it as-is.
+        if is_win and src_name.lower().endswith(".manifest"):
+            processed_names[index] = src_name
+            continue
+
+        # Match against provided UPX exclude patterns.
+        binary_use_upx = use_upx
+        if upx_exclude_patterns:
+            upx_exclude_entry = _match_upx_exclude_patterns(src_name, upx_exclude_patterns)
+            if upx_exclude_entry is not None:
                 logger.info("Disabling UPX for %s due to match in exclude pattern: %s", src_name, upx_exclude_entry)
-                use_upx = False
-                break
+                binary_use_upx = False
+
+        indices_by_upx[binary_use_upx].append(index)
+
+    for binary_use_upx, indices in indices_by_upx.items():
+        if not indices:
+            continue
+        if not use_strip and not binary_use_upx and not is_darwin:
+            processed_group = [binaries[index][0] for index in indices]
+        else:
+            processed_group = _process_binaries_in_cache(
+                [binaries[index] for index in indices],
+                use_strip=use_strip,
+                use_upx=binary_use_upx,
+                target_arch=target_arch,
+                codesign_identity=codesign_identity,
+                entitlements_file=entitlements_file,
+            )
+        for index, processed_name in zip(indices, processed_group):
+            processed_names[index] = processed_name
+
+    return processed_names
+
+
+def _process_binaries_in_cache(
+    binaries,
+    use_strip,
+    use_upx,
+    target_arch,
+    codesign_identity,
+    entitlements_file,
+):
+    """
+    Process the given list of (src_name, dest_name, strict_arch_validation) tuples using the on-disk cache that
+    corresponds to the given options. Return the list of names of processed (cached) files.
+    """
+    from PyInstaller.config import CONF
 
     # Prepare cache directory path. Cache is tied to python major/minor version, but also to various processing options.
-    pyver = f'py{sys.version_info[0]}{sys.version_info[1]}'
-    arch = platform.architecture()[0]
     cache_dir = os.path.join(
         CONF['cachedir'],
-        f'bincache{use_strip:d}{use_upx:d}{pyver}{arch}',
+        f'bincache{use_strip:d}{use_upx:d}{_get_python_version_and_arch()}',
     )
     if target_arch:
         cache_dir = os.path.join(cache_dir, target_arch)
     if is_darwin:
         # Separate by codesign identity
         if codesign_identity:
-            # Compute hex digest of codesign identity string to prevent issues with invalid characters.
-            csi_hash = hashlib.sha256(codesign_identity.encode('utf-8'))
-            cache_dir = os.path.join(cache_dir, csi_hash.hexdigest())
+            # Use hex digest of codesign identity string to prevent issues with invalid characters.
+            cache_dir = os.path.join(cache_dir, _compute_string_digest(codesign_identity))
         else:
             cache_dir = os.path.join(cache_dir, 'adhoc')  # ad-hoc signing
         # Separate by entitlements
         if entitlements_file:
             # Compute hex digest of entitlements file contents
             with open(entitlements_file, 'rb') as fp:
-                ef_hash = hashlib.sha256(fp.read())
+                if compat.is_py311:
+                    ef_hash = hashlib.file_digest(fp, 'sha256')
+                else:
+                    ef_hash = hashlib.sha256(fp.read())
             cache_dir = os.path.join(cache_dir, ef_hash.hexdigest())
         else:
             cache_dir = os.path.join(cache_dir, 'no-entitlements')
     os.makedirs(cache_dir, exist_ok=True)
 
     # Load cache index, if available
-    cache_index_file = os.path.join(cache_dir, "index.dat")
-    try:
-        cache_index = misc.load_py_data_struct(cache_index_file)
-    except FileNotFoundError:
-        cache_index = {}
-    except Exception:
-        # Tell the user they may want to fix their cache... However, do not delete it for them; if it keeps getting
-        # corrupted, we will never find out.
-        logger.warning("PyInstaller bincache may be corrupted; use pyinstaller --clean to fix it.")
-        raise
+    cache_index_file = os.path.join(cache_dir, "index.json")
+    cache_index = _load_cache_index(cache_index_file)
+
+    # In addition to the files stored under their destination names, the cache also holds content-addressed copies of
+    # processed files, identified by the digest of the source file. This way, a file that is collected under different
+    # destination names (for example, by different builds) needs to be processed only once.
+    objects_dir = os.path.join(cache_dir, "objects")
+
+    def _look_up_binary(binary):
+        src_name, dest_name, strict_arch_validation = binary
+
+        # Look up the file in cache; use case-normalized destination name as identifier.
+        cached_id = os.path.normcase(dest_name)
+        cached_name = os.path.join(cache_dir, dest_name)
+
+        # Cache index entries are (size, mtime, digest) tuples describing the source file. If size and modification
+        # time match, assume that the file is unchanged and avoid (re-)computing its digest.
+        src_stat = os.stat(src_name)
+        src_size_mtime = (src_stat.st_size, src_stat.st_mtime_ns)
+        cached_entry = cache_index.get(cached_id)
+        if cached_entry is not None and cached_entry[:2] == src_size_mtime:
+            return cached_name, None, False, None
+
+        src_digest = _compute_file_digest(src_name)
+        new_entry = (*src_size_mtime, src_digest)
+
+        if cached_entry is not None:
+            # If digest matches to the cached digest, we need to update only the size and modification time in the
+            # index...
+            if src_digest == cached_entry[2]:
+                return cached_name, new_entry, False, None
+
+            # ... otherwise remove the cached file.
+            os.remove(cached_name)
+
+        # Check if the processed file is available in content-addressed form. On macOS, the processing depends also on
+        # the depth of the destination directory (as the rpath is set relative to it), and on the strict architecture
+        # validation mode (as the object must not be re-used for a strictly-validated binary if it was produced with
+        # validation errors ignored).
+        object_id = src_digest.hex()
+        if is_darwin:
+            object_id += f'-{len(pathlib.PurePath(dest_name).parent.parts)}-{strict_arch_validation:d}'
+        object_name = os.path.join(objects_dir, object_id)
+        if os.path.isfile(object_name):
+            os.makedirs(os.path.dirname(cached_name), exist_ok=True)
+            try:
+                _link_or_copy_file(object_name, cached_name)
+                return cached_name, new_entry, False, None
+            except FileNotFoundError:
+                # The object was pruned in the meantime (for example, by a concurrent build); process the file.
+                pass
 
-    # Look up the file in cache; use case-normalized destination name as identifier.
-    cached_id = os.path.normcase(dest_name)
-    cached_name = os.path.join(cache_dir, dest_name)
-    src_digest = _compute_file_digest(src_name)
+        return cached_name, new_entry, True, object_name
 
-    if cached_id in cache_index:
-        # If digest matches to the cached digest, return the cached file...
-        if src_digest == cache_index[cached_id]:
-            return cached_name
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        lookup_results = list(executor.map(_look_up_binary, binaries))
 
-        # ... otherwise remove it.
-        os.remove(cached_name)
+    # Indices of binaries that need to be (re-)processed.
+    pending = [index for index, lookup_result in enumerate(lookup_results) if lookup_result[2]]
 
-    cmd = None
+    if pending:
+        input_names = [binaries[index][0] for index in pending]
 
-    if use_upx:
         # If we are to apply both strip and UPX, apply strip first.
-        if use_strip:
-            src_name = process_collected_binary(
-                src_name,
-                dest_name,
+        if use_upx and use_strip:
+            input_names = _process_binaries_in_cache(
+                [binaries[index] for index in pending],
                 use_strip=True,
                 use_upx=False,
                 target_arch=target_arch,
                 codesign_identity=codesign_identity,
                 entitlements_file=entitlements_file,
-                strict_arch_validation=strict_arch_validation,
             )
-        # We need to avoid using UPX with Windows DLLs that have Control Flow Guard enabled, as it breaks them.
-        if is_win and versioninfo.pefile_check_control_flow_guard(src_name):
-            logger.info('Disabling UPX for %s due to CFG!', src_name)
-        elif misc.is_file_qt_plugin(src_name):
-            logger.info('Disabling UPX for %s due to it being a Qt plugin!', src_name)
-        else:
+
+        def _copy_binary(args):
+            index, input_name = args
+            cached_name = lookup_results[index][0]
+
+            process_with = None
+            if use_upx:
+                input_stat = os.stat(input_name)
+                input_key = (input_name, input_stat.st_size, input_stat.st_mtime_ns)
+                # We need to avoid using UPX with Windows DLLs that have Control Flow Guard enabled, as it breaks them.
+                if is_win and _pefile_check_control_flow_guard(*input_key):
+                    logger.info('Disabling UPX for %s due to CFG!', input_name)
+                elif _is_file_qt_plugin(*input_key):
+                    logger.info('Disabling UPX for %s due to it being a Qt plugin!', input_name)
+                else:
+                    process_with = 'upx'
+            elif use_strip:
+                process_with = 'strip'
+
+            # Ensure parent path exists, and remove stale file, if any. The file must not be overwritten in place, as
+            # it might be a hard link to a content-addressed copy.
+            os.makedirs(os.path.dirname(cached_name), exist_ok=True)
+            if os.path.lexists(cached_name):
+                os.remove(cached_name)
+
+            # Copy the file with default permissions bits, then manually set executable bits. This way, we avoid
+            # copying permission bits and metadata from the original file, which might be too restrictive for further
+            # processing (read-only permissions, immutable flag on FreeBSD, and so on).
+            _copy_file_contents(input_name, cached_name)
+            os.chmod(cached_name, 0o755)
+
+            return process_with
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            process_with = list(executor.map(_copy_binary, zip(pending, input_names)))
+
+        # Run strip or UPX on the copied files. Both accept multiple files, so we process them in batches, which
+        # avoids spawning a process for each file.
+        if use_upx:
             upx_exe = 'upx'
             upx_dir = CONF['upx_dir']
             if upx_dir:
@@ -238,77 +453,287 @@ def process_collected_binary(
                 # Binaries built with Visual Studio 7.1 require --strip-loadconf or they will not compress.
                 upx_options.append('--strip-loadconf')
 
-            cmd = [upx_exe, *upx_options, cached_name]
-    elif use_strip:
-        strip_options = []
+            cmd = [upx_exe, *upx_options]
+            files = [lookup_results[index][0] for index, tool in zip(pending, process_with) if tool == 'upx']
+        else:
+            strip_options = []
+            if is_darwin:
+                # The default strip behavior breaks some shared libraries under macOS.
+                strip_options = ["-S"]  # -S = strip only debug symbols.
+            cmd = ["strip", *strip_options]
+            files = [lookup_results[index][0] for index, tool in zip(pending, process_with) if tool == 'strip']
+
+        for files_batch in _split_command_arguments(cmd, files):
+            logger.info("Executing: %s", " ".join(cmd + files_batch))
+            subprocess.run(cmd + files_batch, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # On macOS, we need to modify the given binary's paths to the dependent libraries, in order to ensure they are
+        # relocatable and always refer to location within the frozen application. Specifically, we make all dependent
+        # library paths relative to @rpath, and set @rpath to point to the top-level application directory, relative
+        # to the binary's location (i.e., @loader_path).
+        #
+        # While modifying the headers invalidates existing signatures, we avoid removing them in order to speed things
+        # up (and to avoid potential bugs in the codesign utility, like the one reported on Mac OS 10.13 in #6167).
+        # The forced re-signing at the end should take care of the invalidated signatures.
         if is_darwin:
-            # The default strip behavior breaks some shared libraries under macOS.
-            strip_options = ["-S"]  # -S = strip only debug symbols.
-        cmd = ["strip", *strip_options, cached_name]
-
-    # Ensure parent path exists
-    os.makedirs(os.path.dirname(cached_name), exist_ok=True)
-
-    # Use `shutil.copyfile` to copy the file with default permissions bits, then manually set executable
-    # bits. This way, we avoid copying permission bits and metadata from the original file, which might be too
-    # restrictive for further processing (read-only permissions, immutable flag on FreeBSD, and so on).
-    shutil.copyfile(src_name, cached_name)
-    os.chmod(cached_name, 0o755)
-
-    if cmd:
-        logger.info("Executing: %s", " ".join(cmd))
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-    # On macOS, we need to modify the given binary's paths to the dependent libraries, in order to ensure they are
-    # relocatable and always refer to location within the frozen application. Specifically, we make all dependent
-    # library paths relative to @rpath, and set @rpath to point to the top-level application directory, relative to
-    # the binary's location (i.e., @loader_path).
-    #
-    # While modifying the headers invalidates existing signatures, we avoid removing them in order to speed things up
-    # (and to avoid potential bugs in the codesign utility, like the one reported on Mac OS 10.13 in #6167).
-    # The forced re-signing at the end should take care of the invalidated signatures.
-    if is_darwin:
+
+            def _process_macos_binary(index):
+                src_name, dest_name, strict_arch_validation = binaries[index]
+                cached_name = lookup_results[index][0]
+                try:
+                    osxutils.binary_to_target_arch(cached_name, target_arch, display_name=src_name)
+                    #osxutils.remove_signature_from_binary(cached_name)  # Disabled as per comment above.
+                    target_rpath = str(
+                        pathlib.PurePath('@loader_path', *['..' for level in pathlib.PurePath(dest_name).parent.parts])
+                    )
+                    osxutils.set_dylib_dependency_paths(cached_name, target_rpath)
+                    osxutils.sign_binary(cached_name, codesign_identity, entitlements_file)
+                except osxutils.InvalidBinaryError:
+                    # Raised by osxutils.binary_to_target_arch when the given file is not a valid macOS binary (for
+                    # example, a linux .so file; see issue #6327). The error prevents any further processing, so just
+                    # ignore it.
+                    pass
+                except osxutils.IncompatibleBinaryArchError:
+                    # Raised by osxutils.binary_to_target_arch when the given file does not contain (all) required arch
+                    # slices. Depending on the strict validation mode, re-raise or swallow the error.
+                    #
+                    # Strict validation should be enabled only for binaries where the architecture *must* match the
+                    # target one, i.e., the extension modules. Everything else is pretty much a gray area, for example:
+                    #  * a universal2 extension may have its x86_64 and arm64 slices linked against distinct
+                    #    single-arch/thin shared libraries
+                    #  * a collected executable that is launched by python code via a subprocess can be x86_64-only,
+                    #    even though the actual python code is running on M1 in native arm64 mode.
+                    if strict_arch_validation:
+                        raise
+                    logger.debug("File %s failed optional architecture validation - collecting as-is!", src_name)
+                except Exception as e:
+                    raise SystemError(f"Failed to process binary {cached_name!r}!") from e
+
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                list(executor.map(_process_macos_binary, pending))
+
+        # Store content-addressed copies of processed files.
+        os.makedirs(objects_dir, exist_ok=True)
+        for index in pending:
+            cached_name, _, _, object_name = lookup_results[index]
+            if not os.path.exists(object_name):
+                _link_or_copy_file(cached_name, object_name)
+
+    # Update cache index
+    new_entries = {
+        os.path.normcase(binary[1]): lookup_result[1]
+        for binary, lookup_result in zip(binaries, lookup_results) if lookup_result[1] is not None
+    }
+    if new_entries:
+        _update_cache_index(cache_index_file, new_entries)
+
+    return [lookup_result[0] for lookup_result in lookup_results]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_python_version_and_arch():
+    # NOTE: `platform.architecture()` runs the `file` utility on the python executable, so call it only once.
+    pyver = f'py{sys.version_info[0]}{sys.version_info[1]}'
+    arch = platform.architecture()[0]
+    return f'{pyver}{arch}'
+
+
+@functools.lru_cache(maxsize=16)
+def _compute_string_digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def _link_or_copy_file(src_name, dest_name, mode=0o755):
+    """
+    Hard-link the given file to the destination name, replacing existing file, if any. If hard links are not supported,
+    copy the file instead, and set the permission bits of the copy to the given mode (unless mode is None, in which case
+    the copy is created with default permission bits).
+    """
+    # Create the link (or copy) under temporary name, and rename it into place; this never modifies existing file in
+    # place, which might be a hard link to another file in the cache.
+    tmp_name = f'{dest_name}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.link(src_name, tmp_name)
+    except OSError:
+        shutil.copyfile(src_name, tmp_name)
+        if mode is not None:
+            os.chmod(tmp_name, mode)
+    os.replace(tmp_name, dest_name)
+
+
+# FICLONE ioctl request code (from <linux/fs.h>).
+_FICLONE = 0x40049409
+
+
+def _copy_file_contents(src_name, dest_name):
+    """
+    Copy contents of the source file into the destination file, without copying permission bits or other metadata.
+
+    On Linux, first try to create a copy-on-write clone of the file using the FICLONE ioctl; on file systems that
+    support it (btrfs, XFS, and so on), this does not copy the actual data. If the ioctl fails, fall back to
+    `shutil.copyfile`, which also uses in-kernel copy where possible.
+    """
+    if compat.is_linux:
         try:
-            osxutils.binary_to_target_arch(cached_name, target_arch, display_name=src_name)
-            #osxutils.remove_signature_from_binary(cached_name)  # Disabled as per comment above.
-            target_rpath = str(
-                pathlib.PurePath('@loader_path', *['..' for level in pathlib.PurePath(dest_name).parent.parts])
-            )
-            osxutils.set_dylib_dependency_paths(cached_name, target_rpath)
-            osxutils.sign_binary(cached_name, codesign_identity, entitlements_file)
-        except osxutils.InvalidBinaryError:
-            # Raised by osxutils.binary_to_target_arch when the given file is not a valid macOS binary (for example,
-            # a linux .so file; see issue #6327). The error prevents any further processing, so just ignore it.
+            import fcntl
+            with open(src_name, 'rb') as src_fp, open(dest_name, 'wb') as dest_fp:
+                fcntl.ioctl(dest_fp.fileno(), _FICLONE, src_fp.fileno())
+            return
+        except OSError:
             pass
-        except osxutils.IncompatibleBinaryArchError:
-            # Raised by osxutils.binary_to_target_arch when the given file does not contain (all) required arch slices.
-            # Depending on the strict validation mode, re-raise or swallow the error.
-            #
-            # Strict validation should be enabled only for binaries where the architecture *must* match the target one,
-            # i.e., the extension modules. Everything else is pretty much a gray area, for example:
-            #  * a universal2 extension may have its x86_64 and arm64 slices linked against distinct single-arch/thin
-            #    shared libraries
-            #  * a collected executable that is launched by python code via a subprocess can be x86_64-only, even though
-            #    the actual python code is running on M1 in native arm64 mode.
-            if strict_arch_validation:
-                raise
-            logger.debug("File %s failed optional architecture validation - collecting as-is!", src_name)
-        except Exception as e:
-            raise SystemError(f"Failed to process binary {cached_name!r}!") from e
+    shutil.copyfile(src_name, dest_name)
+
+
+# Cached variants of file checks used to determine whether UPX can be applied to a binary, which require parsing or
+# scanning the file. The size and modification time of the file are used only as part of the cache key.
+@functools.lru_cache(maxsize=4096)
+def _pefile_check_control_flow_guard(filename, file_size, file_mtime):
+    return versioninfo.pefile_check_control_flow_guard(filename)
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_file_qt_plugin(filename, file_size, file_mtime):
+    return misc.is_file_qt_plugin(filename)
 
-    # Update cache index
-    cache_index[cached_id] = src_digest
-    misc.save_py_data_struct(cache_index_file, cache_index)
 
-    return cached_name
+# Approximate limit on the length of command line when invoking strip or UPX on multiple files; the actual limits are
+# 32 KiB on Windows and (typically) at least 128 KiB on POSIX systems.
+_MAX_COMMAND_LINE_LENGTH = 16 * 1024 if is_win else 96 * 1024
+
+
+def _split_command_arguments(cmd, files):
+    """
+    Split the given list of files into batches that can be appended to the given command without exceeding the
+    maximum command line length.
+    """
+    base_length = sum(len(arg) + 1 for arg in cmd)
+    batch = []
+    batch_length = base_length
+    for filename in files:
+        # Account for separator and potential quotes.
+        arg_length = len(filename) + 3
+        if batch and batch_length + arg_length > _MAX_COMMAND_LINE_LENGTH:
+            yield batch
+            batch = []
+            batch_length = base_length
+        batch.append(filename)
+        batch_length += arg_length
+    if batch:
+        yield batch
+
+
+# Lock that serializes updates of binary cache index files, as they may be performed from multiple threads.
+_cache_index_lock = threading.Lock()
+
+
+def _load_cache_index(cache_index_file):
+    """
+    Load the binary cache index. The index is stored as JSON, mapping case-normalized destination names to
+    [size, mtime, hex_digest] lists; these are returned as (size, mtime, digest) tuples.
+    """
+    try:
+        with open(cache_index_file, 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+        return {
+            cached_id: (src_size, src_mtime, bytes.fromhex(src_digest))
+            for cached_id, (src_size, src_mtime, src_digest) in data.items()
+        }
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        # Tell the user they may want to fix their cache... However, do not delete it for them; if it keeps getting
+        # corrupted, we will never find out.
+        logger.warning("PyInstaller bincache may be corrupted; use pyinstaller --clean to fix it.")
+        raise
+
+
+def _update_cache_index(cache_index_file, new_entries):
+    # Re-load the index under lock, so that we do not discard entries added by other threads in the meantime.
+    with _cache_index_lock:
+        cache_index = _load_cache_index(cache_index_file)
+        cache_index.update(new_entries)
+        data = {
+            cached_id: [src_size, src_mtime, src_digest.hex()]
+            for cached_id, (src_size, src_mtime, src_digest) in cache_index.items()
+        }
+        # Write the index into a temporary file and rename it into place, so that an interrupted build or a concurrent
+        # build never observes (and leaves behind) partially-written index.
+        tmp_file = f'{cache_index_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, sort_keys=True)
+        os.replace(tmp_file, cache_index_file)
+
+        _prune_cache_objects(os.path.join(os.path.dirname(cache_index_file), "objects"), data)
+
+
+def _prune_cache_objects(objects_dir, index_data):
+    """
+    Remove content-addressed copies of processed files whose source digest is not referenced by the cache index
+    anymore; for example, the copies of old versions of upgraded libraries.
+    """
+    referenced_digests = {src_digest for _, _, src_digest in index_data.values()}
+    try:
+        entries = list(os.scandir(objects_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        # Skip temporary files of copies that are being stored at the moment.
+        if entry.name.endswith('.tmp'):
+            continue
+        # Object names consist of the hex digest of the source file, optionally followed by dash-separated suffixes.
+        if entry.name.split('-', 1)[0] in referenced_digests:
+            continue
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            logger.debug("Failed to remove unreferenced cache object %s: %s", entry.path, e)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_upx_exclude_patterns(upx_exclude):
+    """
+    Pre-compile the given tuple of UPX exclude patterns for use with `_match_upx_exclude_patterns`. Each pattern is
+    split into path components, and each component is translated into a regular expression, so that the (cached)
+    result can be matched against all collected binaries.
+    """
+    compiled_patterns = []
+    for upx_exclude_entry in upx_exclude:
+        pattern_path = pathlib.PurePath(os.path.normcase(upx_exclude_entry))
+        is_anchored = bool(pattern_path.drive or pattern_path.root)
+        part_regexes = tuple(re.compile(fnmatch.translate(part)) for part in pattern_path.parts)
+        compiled_patterns.append((upx_exclude_entry, is_anchored, part_regexes))
+    return compiled_patterns
+
+
+def _match_upx_exclude_patterns(src_name, compiled_patterns):
+    """
+    Match the given file name against UPX exclude patterns that were pre-compiled by `_compile_upx_exclude_patterns`.
+    Return the first matching pattern, or None.
+
+    The matching follows the semantics of `pathlib.PurePath.match`: it is performed from right to left, supports the *
+    wildcard, but does not support the "**" syntax for directory recursion. Case sensitivity follows the OS default.
+    """
+    src_parts = pathlib.PurePath(os.path.normcase(src_name)).parts
+    for upx_exclude_entry, is_anchored, part_regexes in compiled_patterns:
+        if len(part_regexes) > len(src_parts) or (is_anchored and len(part_regexes) != len(src_parts)):
+            continue
+        if all(regex.match(part) for part, regex in zip(reversed(src_parts), reversed(part_regexes))):
+            return upx_exclude_entry
+    return None
 
 
 def _compute_file_digest(filename):
-    hasher = hashlib.md5()
+    # The digest is used only to detect changes to the source file of a cached binary, so we do not need a
+    # cryptographic-strength hash; use 128-bit BLAKE2b, which is considerably faster than MD5.
     with open(filename, "rb") as fp:
-        for chunk in iter(lambda: fp.read(16 * 1024), b""):
-            hasher.update(chunk)
-    return bytearray(hasher.digest())
+        if compat.is_py311:
+            # `hashlib.file_digest` performs the read/update loop in C, using a re-usable buffer.
+            hasher = hashlib.file_digest(fp, lambda: hashlib.blake2b(digest_size=16))
+        else:
+            hasher = hashlib.blake2b(digest_size=16)
+            for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    return hasher.digest()
 
 
 def _check_path_overlap(path):
@@ -448,7 +873,11 @@ def format_binaries_and_datas(binaries_or_datas, workingdir=None):
 
         # Normalize paths.
         src_root_path_or_glob = os.path.normpath(src_root_path_or_glob)
-        if os.path.isfile(src_root_path_or_glob):
+        if not glob.has_magic(src_root_path_or_glob):
+            # Literal path (the most common case); no need to go through glob machinery.
+            src_root_paths = [src_root_path_or_glob] if os.path.exists(src_root_path_or_glob) else []
+        elif os.path.isfile(src_root_path_or_glob):
+            # Literal path to a file whose name contains glob special characters (see issue #2314).
             src_root_paths = [src_root_path_or_glob]
         else:
             # List of the absolute paths of all source paths matching the current glob.
@@ -465,32 +894,51 @@ def format_binaries_and_datas(binaries_or_datas, workingdir=None):
                     os.path.normpath(src_root_path),
                 ))
             elif os.path.isdir(src_root_path):
-                for src_dir, src_subdir_basenames, src_file_basenames in os.walk(src_root_path):
-                    # Ensure the current source directory is a subdirectory of the passed top-level source directory.
-                    # Since os.walk() does *NOT* follow symlinks by default, this should be the case. (But let's make
-                    # sure.)
-                    assert src_dir.startswith(src_root_path)
-
-                    # Relative path of the current target directory, obtained by:
-                    #
-                    # * Stripping the top-level source directory from the current source directory (e.g., removing
-                    #   "/top" from "/top/dir").
-                    # * Normalizing the result to remove redundant relative paths (e.g., removing "./" from
-                    #   "trg/./file").
-                    trg_dir = os.path.normpath(os.path.join(trg_root_dir, os.path.relpath(src_dir, src_root_path)))
-
-                    for src_file_basename in src_file_basenames:
-                        src_file = os.path.join(src_dir, src_file_basename)
-                        if os.path.isfile(src_file):
-                            # Normalize the result to remove redundant relative paths (e.g., removing "./" from
-                            # "trg/./file").
-                            toc_datas.add((
-                                os.path.normpath(os.path.join(trg_dir, src_file_basename)), os.path.normpath(src_file)
-                            ))
+                # Normalize the top-level paths to remove redundant relative paths (e.g., removing "./" from
+                # "trg/./dir"); the paths generated from them during the directory walk are then already normalized.
+                for src_file, trg_file in _walk_data_directory(
+                    os.path.normpath(src_root_path), os.path.normpath(trg_root_dir)
+                ):
+                    toc_datas.add((trg_file, src_file))
 
     return toc_datas
 
 
+def _walk_data_directory(src_dir, trg_dir):
+    """
+    Recursively walk the given source directory, and yield (src_file, trg_file) tuples for all files in it, where
+    trg_file is the file's path relative to the source directory, prefixed with the given target directory. If the
+    given directory paths are normalized, so are the generated paths.
+
+    Equivalent to using `os.walk()` with `os.path.isfile()` check on each file, but uses the `os.DirEntry` objects
+    obtained via `os.scandir()` to avoid additional `stat()` calls. Symbolic links to directories are not followed
+    (same as with `os.walk()`), and broken symbolic links are ignored.
+    """
+    try:
+        entries = list(os.scandir(src_dir))
+    except OSError:
+        # Ignore unreadable directories, same as `os.walk()`.
+        return
+
+    # Avoid generating paths with redundant "./" prefix.
+    src_prefix = '' if src_dir == os.curdir else os.path.join(src_dir, '')
+    trg_prefix = '' if trg_dir == os.curdir else os.path.join(trg_dir, '')
+
+    subdirs = []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.name)
+            elif entry.is_file():
+                yield src_prefix + entry.name, trg_prefix + entry.name
+        except OSError:
+            continue
+
+    for name in subdirs:
+        yield from _walk_data_directory(src_prefix + name, trg_prefix + name)
+
+
 def get_code_object(modname, filename):
     """
     Get the code-object for a module.
@@ -518,44 +966,102 @@ def get_code_object(modname, filename):
             # Assume this is a source .py file, but allow an arbitrary extension (other than .pyc, which is taken in
             # the above branch). This allows entry-point scripts to have an arbitrary (or no) extension, as tested by
             # the `test_arbitrary_ext` in `test_basic.py`.
-            logger.debug('Compiling python script/module file %s', filename)
-
-            with open(filename, 'rb') as f:
-                source = f.read()
-
+            #
             # If entry-point script has no suffix, append .py when compiling the source. In POSIX builds, the executable
             # has no suffix either; this causes issues with `traceback` module, as it tries to read the executable file
             # when trying to look up the code for the entry-point script (when current working directory contains the
             # executable).
-            _, ext = os.path.splitext(filename)
+            code_filename = filename
             if not ext:
                 logger.debug("Appending .py to compiled entry-point name...")
-                filename += '.py'
+                code_filename += '.py'
+
+            with open(filename, 'rb') as f:
+                source = f.read()
+
+            # Try the on-disk code object cache first, to avoid re-compiling unchanged source files in subsequent
+            # builds.
+            source_hash = importlib.util.source_hash(source)
+            code_cache_file = _get_code_cache_file(filename, code_filename)
+            code_object = _load_cached_code_object(code_cache_file, source_hash) if code_cache_file else None
+            if code_object is not None:
+                logger.debug('Using cached code object for python script/module file %s', filename)
+                return code_object
+
+            logger.debug('Compiling python script/module file %s', filename)
 
             try:
-                code_object = compile(source, filename, 'exec')
+                code_object = compile(source, code_filename, 'exec')
             except SyntaxError:
-                logger.warning("Sytnax error while compiling %s", filename)
+                logger.warning("Sytnax error while compiling %s", code_filename)
                 raise
 
+            if code_cache_file:
+                _save_cached_code_object(code_cache_file, code_object, source_hash)
+
     return code_object
 
 
-def strip_paths_in_code(co, new_filename=None):
-    # Paths to remove from filenames embedded in code objects
-    replace_paths = sys.path + CONF['pathex']
-    # Make sure paths end with os.sep and the longest paths are first
-    replace_paths = sorted((os.path.join(f, '') for f in replace_paths), key=len, reverse=True)
+def _get_code_cache_file(filename, code_filename):
+    """
+    Return the path to the on-disk code object cache entry for the given source file, or None if the cache is not
+    available. Cache entries are identified by the source file's absolute path, the filename that is embedded in the
+    code object (as passed to `compile`), and the interpreter's optimization level. Each source file thus has a single
+    cache entry, which is overwritten when the source file changes; the entry's validity is determined from the source
+    hash stored in it.
+    """
+    cache_dir = CONF.get('cachedir')
+    if not cache_dir:
+        return None
+    src_path = os.path.normpath(os.path.abspath(filename))
+    cache_key = f"{src_path}\0{code_filename}\0{sys.flags.optimize}"
+    cache_key_hash = hashlib.blake2b(cache_key.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+    pyver = f'py{sys.version_info[0]}{sys.version_info[1]}'
+    code_cache_dir = os.path.join(cache_dir, f'codecache-{pyver}')
+    _prune_cache_dir(code_cache_dir)
+    return os.path.join(code_cache_dir, cache_key_hash[:2], cache_key_hash)
+
 
+def _load_cached_code_object(cache_file, source_hash):
+    try:
+        with open(cache_file, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return None
+    # Validate the magic, as it may differ between pre-release and final versions of the same python minor version, and
+    # the source hash.
+    if data[:4] != compat.BYTECODE_MAGIC or data[4:12] != source_hash:
+        return None
+    try:
+        return marshal.loads(data[12:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _save_cached_code_object(cache_file, code_object, source_hash):
+    # Write into a temporary file and rename it, so that concurrent builds never observe partially-written entries.
+    # Errors are not fatal; the code object is simply not cached.
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as fp:
+            fp.write(compat.BYTECODE_MAGIC)
+            fp.write(source_hash)
+            marshal.dump(code_object, fp)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.debug("Failed to write code object cache entry %s: %s", cache_file, e)
+
+
+def strip_paths_in_code(co, new_filename=None):
     if new_filename is None:
+        # Paths to remove from filenames embedded in code objects
+        replace_paths_regex = _compile_replace_paths_regex(tuple(sys.path + CONF['pathex']))
         original_filename = os.path.normpath(co.co_filename)
-        for f in replace_paths:
-            if original_filename.startswith(f):
-                new_filename = original_filename[len(f):]
-                break
-
-        else:
+        match = replace_paths_regex.match(original_filename) if replace_paths_regex else None
+        if match is None:
             return co
+        new_filename = original_filename[match.end():]
 
     code_func = type(co)
 
@@ -564,9 +1070,30 @@ def strip_paths_in_code(co, new_filename=None):
         for const_co in co.co_consts
     )
 
+    # If nothing needs to be replaced, return the original code object, instead of creating an identical copy.
+    if co.co_filename == new_filename and all(const is orig_const for const, orig_const in zip(consts, co.co_consts)):
+        return co
+
     return co.replace(co_consts=consts, co_filename=new_filename)
 
 
+@functools.lru_cache(maxsize=1)
+def _compile_replace_paths_regex(replace_paths):
+    """
+    Compile the given tuple of paths into a regular expression that matches the longest of them at the start of a
+    filename. Returns None if no paths are given.
+    """
+    if not replace_paths:
+        return None
+    # Make sure paths end with os.sep and the longest paths are first
+    replace_paths = sorted((os.path.join(f, '') for f in replace_paths), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(f) for f in replace_paths))
+
+
+# Prefixes of source paths that `_should_include_system_binary` considers to be system libraries.
+_SYSTEM_LIBRARY_PREFIXES = ('/lib', '/usr/lib')
+
+
 def _should_include_system_binary(binary_tuple, exceptions):
     """
     Return True if the given binary_tuple describes a system binary that should be included.
@@ -579,89 +1106,250 @@ def _should_include_system_binary(binary_tuple, exceptions):
     if dest.startswith('lib-dynload'):
         return True
     src = binary_tuple[1]
-    if fnmatch.fnmatch(src, '*python*'):
+    if 'python' in os.path.normcase(src):
         return True
-    if not src.startswith('/lib') and not src.startswith('/usr/lib'):
+    if not src.startswith(_SYSTEM_LIBRARY_PREFIXES):
         return True
-    for exception in exceptions:
-        if fnmatch.fnmatch(dest, exception):
-            return True
-    return False
+    exceptions_regex = _compile_fnmatch_patterns(tuple(exceptions))
+    return exceptions_regex is not None and exceptions_regex.match(os.path.normcase(dest)) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_fnmatch_patterns(patterns):
+    """
+    Compile the given tuple of shell-style wildcard patterns into a single regular expression, which matches the same
+    (normcase-d) names as `fnmatch.fnmatch` with any of the patterns. Returns None if no patterns are given.
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(os.path.normcase(pattern))})' for pattern in patterns))
+
+
+# Flags field of the header of .pyc files generated by `compile_pymodule`. PEP-552: hash-based pyc, check_source=False.
+_PYC_FLAGS = struct.pack('<I', 0b01)
 
 
-def compile_pymodule(name, src_path, workpath, code_cache=None):
+def compile_pymodule(name, src_path, workpath, code_cache=None, ensure_dirs=True):
     """
     Given the TOC entry (name, path, typecode) for a pure-python module, compile the module in the specified working
     directory, and return the TOC entry for collecting the byte-compiled module. No-op for typecodes other than
     PYMODULE.
+
+    If `ensure_dirs` is False, the caller is responsible for creating the parent directories of the target .pyc file
+    in advance (for example, using `ensure_pyc_dirs`).
     """
 
     # Construct the target .pyc filename in the workpath
-    split_name = name.split(".")
-    if "__init__" in src_path:
-        # __init__ module; use "__init__" as module name, and construct parent path using all components of the
-        # fully-qualified name
-        parent_dirs = split_name
-        mod_basename = "__init__"
+    src_basename = os.path.basename(src_path)
+    pyc_path = _get_pymodule_pyc_path(name, src_basename, workpath)
+
+    # Read the module's source file; for binary-only modules, read the marshalled code object from the original .pyc
+    # file (i.e., its contents without the 16-byte header).
+    ext = os.path.splitext(src_basename)[1].lower()
+    if ext == '.py':
+        with open(src_path, 'rb') as fp:
+            src_data = fp.read()
+    elif ext == '.pyc':
+        if os.path.isfile(src_path):
+            # Stand-alone .pyc file; validate the header before reading the rest of the file.
+            with open(src_path, 'rb') as fp:
+                if fp.read(16)[:4] != compat.BYTECODE_MAGIC:
+                    raise ValueError(f"The .pyc module {src_path} was compiled for incompatible version of python!")
+                src_data = fp.read()
+        else:
+            # Archive-embedded .pyc file; read it using helper function, which also validates the header.
+            src_data = _read_pyc_data(src_path)[16:]
     else:
-        # Regular module; use last component of the fully-qualified name as module name, and the rest as the parent
-        # path.
-        parent_dirs = split_name[:-1]
-        mod_basename = split_name[-1]
-    pyc_path = os.path.join(workpath, *parent_dirs, mod_basename + '.pyc')
+        raise ValueError(f"Invalid python module file {src_path}; unhandled extension {ext}!")
+
+    # PEP-552 source hash; stored in the header of the generated .pyc file, and used to determine whether the existing
+    # .pyc file can be re-used.
+    source_hash = importlib.util.source_hash(src_data)
 
     # If .pyc file already exists in our workpath, check if we can re-use it. For that:
-    #  - its modification timestamp must be newer than that of the source file
     #  - it must be compiled for compatible python version
-    if os.path.exists(pyc_path):
-        can_reuse = False
-        if misc.mtime(pyc_path) > misc.mtime(src_path):
-            with open(pyc_path, 'rb') as fh:
-                can_reuse = fh.read(4) == compat.BYTECODE_MAGIC
-
-        if can_reuse:
-            return pyc_path
+    #  - its source hash must match the hash of the source file
+    try:
+        with open(pyc_path, 'rb') as fh:
+            pyc_header = fh.read(16)
+    except FileNotFoundError:
+        pyc_header = b''
+    if pyc_header[:4] == compat.BYTECODE_MAGIC and pyc_header[8:16] == source_hash:
+        return pyc_path
 
     # Ensure the existence of parent directories for the target pyc path
-    os.makedirs(os.path.dirname(pyc_path), exist_ok=True)
+    if ensure_dirs:
+        os.makedirs(os.path.dirname(pyc_path), exist_ok=True)
+
+    # Check if the persistent module cache contains the compiled module; if it does, link (or copy) it into place. The
+    # entry is subject to the same checks as the existing .pyc file in the workpath.
+    pymodule_cache_file = _get_pymodule_cache_file(src_path)
+    if pymodule_cache_file and _is_valid_cached_pymodule(pymodule_cache_file, source_hash):
+        # The .pyc files are collected as data files; keep the default permission bits, as when writing them.
+        _link_or_copy_file(pymodule_cache_file, pyc_path, mode=None)
+        return pyc_path
 
     # Check if optional cache contains module entry
     code_object = code_cache.get(name, None) if code_cache else None
 
     if code_object is None:
-        _, ext = os.path.splitext(src_path)
-        ext = ext.lower()
-
         if ext == '.py':
-            # Source py file; compile...
-            py_compile.compile(src_path, pyc_path)
-            # ... and read the contents
-            with open(pyc_path, 'rb') as fp:
-                pyc_data = fp.read()
-        elif ext == '.pyc':
-            # The module is available in binary-only form. Read the contents of .pyc file using helper function, which
-            # supports reading from either stand-alone or archive-embedded .pyc files.
-            pyc_data = _read_pyc_data(src_path)
+            # Source py file; compile it in-memory, directly into code object. This is equivalent to what
+            # `py_compile.compile` does, except that we avoid writing the .pyc file and reading it back.
+            code_object = compile(src_data, src_path, 'exec', dont_inherit=True, optimize=-1)
         else:
-            raise ValueError(f"Invalid python module file {src_path}; unhandled extension {ext}!")
-
-        # Unmarshal code object; this is necessary if we want to strip paths from it
-        code_object = marshal.loads(pyc_data[16:])
+            # Binary-only module; unmarshal code object from the .pyc data.
+            code_object = marshal.loads(src_data)
 
     # Strip code paths from the code object
     code_object = strip_paths_in_code(code_object)
 
-    # Write module file
-    with open(pyc_path, 'wb') as fh:
-        fh.write(compat.BYTECODE_MAGIC)
-        fh.write(struct.pack('<I', 0b01))  # PEP-552: hash-based pyc, check_source=False
-        fh.write(b'\00' * 8)  # Zero the source hash
-        marshal.dump(code_object, fh)
+    # Write module file; assemble the header and marshalled code object, and write them in a single call.
+    pyc_data = bytearray(compat.BYTECODE_MAGIC)
+    pyc_data += _PYC_FLAGS
+    pyc_data += source_hash
+    pyc_data += marshal.dumps(code_object)
+    # The existing .pyc file might be a hard link to the persistent module cache entry, so never modify it in place;
+    # write a new file and rename it into place instead.
+    tmp_pyc_path = f'{pyc_path}.{os.getpid()}.tmp'
+    with open(tmp_pyc_path, 'wb') as fh:
+        fh.write(pyc_data)
+    os.replace(tmp_pyc_path, pyc_path)
+
+    # Store the compiled module in the persistent module cache. Errors are not fatal; the module is simply not cached.
+    if pymodule_cache_file:
+        try:
+            os.makedirs(os.path.dirname(pymodule_cache_file), exist_ok=True)
+            _link_or_copy_file(pyc_path, pymodule_cache_file, mode=None)
+        except OSError as e:
+            logger.debug("Failed to write module cache entry %s: %s", pymodule_cache_file, e)
 
     # Return output path
     return pyc_path
 
 
+def _get_pymodule_pyc_path(name, src_basename, workpath):
+    """
+    Return the path to the .pyc file for the given pure-python module in the specified working directory.
+    """
+    # Turn the fully-qualified name into relative path by replacing dots with path separators.
+    pyc_relpath = name.replace('.', os.sep)
+    if src_basename.startswith("__init__"):
+        # __init__ module; use "__init__" as module name, and all components of the fully-qualified name as the parent
+        # path.
+        pyc_relpath += os.sep + '__init__.pyc'
+    else:
+        # Regular module; the last component of the fully-qualified name is the module name.
+        pyc_relpath += '.pyc'
+    return os.path.join(workpath, pyc_relpath)
+
+
+def ensure_pyc_dirs(entries, workpath):
+    """
+    Create the parent directories of .pyc files that `compile_pymodule` generates for the given list of
+    (name, src_path) entries in the specified working directory. Each unique directory is created only once.
+    """
+    pyc_dirs = {
+        os.path.dirname(_get_pymodule_pyc_path(name, os.path.basename(src_path), workpath))
+        for name, src_path in entries
+    }
+    for pyc_dir in pyc_dirs:
+        os.makedirs(pyc_dir, exist_ok=True)
+
+
+def _get_pymodule_cache_file(src_path):
+    """
+    Return the path to the persistent module cache entry for the given source file, or None if the cache is not
+    available. Cache entries are identified by the source file's absolute path, by the part of the path that is stripped
+    from the filenames embedded in the code objects, and by the interpreter's optimization level. Each source file thus
+    has a single cache entry, which is overwritten when the source file changes; the entry's validity is determined from
+    the source hash in its header.
+    """
+    cache_dir = CONF.get('cachedir')
+    if not cache_dir:
+        return None
+    src_path = os.path.normpath(os.path.abspath(src_path))
+    replace_paths_regex = _compile_replace_paths_regex(tuple(sys.path + CONF.get('pathex', [])))
+    match = replace_paths_regex.match(src_path) if replace_paths_regex else None
+    stripped_length = match.end() if match else 0
+    cache_key = f"{src_path}\0{stripped_length}\0{sys.flags.optimize}"
+    cache_key_hash = hashlib.blake2b(cache_key.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
+    pyver = f'py{sys.version_info[0]}{sys.version_info[1]}'
+    pymodule_cache_dir = os.path.join(cache_dir, f'pymodcache-{pyver}')
+    _prune_cache_dir(pymodule_cache_dir)
+    return os.path.join(pymodule_cache_dir, cache_key_hash[:2], cache_key_hash + '.pyc')
+
+
+def _is_valid_cached_pymodule(cache_file, source_hash):
+    # Validate the magic, as it may differ between pre-release and final versions of the same python minor version, and
+    # the source hash.
+    try:
+        with open(cache_file, 'rb') as fp:
+            header = fp.read(16)
+    except OSError:
+        return False
+    return header[:4] == compat.BYTECODE_MAGIC and header[8:16] == source_hash
+
+
+# Entries in the persistent caches (module cache, code object cache) that have not been written for this long are
+# removed, so that the entries for source files that have been removed or moved do not accumulate. The pruning is
+# performed at most once per interval.
+_CACHE_ENTRY_MAX_AGE = 30 * 24 * 60 * 60
+_CACHE_PRUNE_INTERVAL = 24 * 60 * 60
+
+_pruned_cache_dirs = set()
+
+
+def _prune_cache_dir(cache_dir):
+    """
+    Remove stale entries from the given persistent cache directory, which stores entries in two-level layout
+    (<cache_dir>/<xx>/<entry>). The time of last pruning is recorded in the modification time of a stamp file in the
+    cache directory. Errors are not fatal; they are only logged.
+    """
+    if cache_dir in _pruned_cache_dirs:
+        return
+    _pruned_cache_dirs.add(cache_dir)
+
+    stamp_file = os.path.join(cache_dir, 'last-prune')
+    now = time.time()
+    try:
+        if now - os.stat(stamp_file).st_mtime < _CACHE_PRUNE_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(stamp_file, 'wb'):
+            pass
+        for subdir in os.scandir(cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if now - entry.stat().st_mtime > _CACHE_ENTRY_MAX_AGE:
+                    os.remove(entry.path)
+    except OSError as e:
+        logger.debug("Failed to prune cache directory %s: %s", cache_dir, e)
+
+
+def compile_pymodules(entries, workpath, code_cache=None):
+    """
+    Compile the given list of (name, src_path) entries for pure-python modules in the specified working directory,
+    using `compile_pymodule`. Returns the list of paths to byte-compiled modules, in the order of given entries.
+    """
+    entries = list(entries)
+
+    # Create all parent directories up front, instead of having each `compile_pymodule` call ensure their existence.
+    ensure_pyc_dirs(entries, workpath)
+
+    return [
+        compile_pymodule(name, src_path, workpath=workpath, code_cache=code_cache, ensure_dirs=False)
+        for name, src_path in entries
+    ]
+
+
 def _read_pyc_data(filename):
     """
     Helper for reading data from .pyc files. Supports both stand-alone and archive-embedded .pyc files. Used by
@@ -691,28 +1379,43 @@ def _read_pyc_data(filename):
     return pyc_data
 
 
-def postprocess_binaries_toc_pywin32(binaries):
+# Names of `pywin32` directories, which are added to `sys.path` by `pywin32.pth`; used by
+# `postprocess_binaries_toc_pywin32`. The names are lower-case; the set of their common spellings allows matching the
+# names without lower-casing them first.
+_PYWIN32_SUBDIRS = frozenset({'win32', 'pythonwin', 'pywin32_system32'})
+_PYWIN32_SUBDIRS_SPELLINGS = frozenset({
+    'win32',
+    'Win32',
+    'WIN32',
+    'pythonwin',
+    'Pythonwin',
+    'PYTHONWIN',
+    'pywin32_system32',
+    'Pywin32_System32',
+    'PYWIN32_SYSTEM32',
+})
+
+# Names of `pywin32` DLLs that are diverted by `postprocess_binaries_toc_pywin32_anaconda`, the destination directories
+# from which they are diverted, and the destination directory prefix to which they are diverted.
+_PYWIN32_DLL_CANDIDATES = frozenset({
+    f"pywintypes{sys.version_info[0]}{sys.version_info[1]}.dll",
+    f"pythoncom{sys.version_info[0]}{sys.version_info[1]}.dll",
+})
+_PYWIN32_DUPLICATE_DIRS = frozenset({'', '.', 'win32'})
+_PYWIN32_SYS32_PREFIX = "pywin32_system32" + os.sep
+
+
+def postprocess_binaries_toc_pywin32(binaries, anaconda=False):
     """
     Process the given `binaries` TOC list to apply work around for `pywin32` package, fixing the target directory
-    for collected extensions.
+    for collected extensions. If `anaconda` is True, the work around for Anaconda `pywin32` package (see
+    `postprocess_binaries_toc_pywin32_anaconda`) is applied as well, in the same pass over the TOC list.
     """
-    # Ensure that all files collected from `win32`  or `pythonwin` into top-level directory are put back into
-    # their corresponding directories. They end up in top-level directory because `pywin32.pth` adds both
-    # directories to the `sys.path`, so they end up visible as top-level directories. But these extensions
-    # might in fact be linked against each other, so we should preserve the directory layout for consistency
-    # between modulegraph-discovered extensions and linked binaries discovered by link-time dependency analysis.
-    # Within the same framework, also consider `pywin32_system32`, just in case.
-    PYWIN32_SUBDIRS = {'win32', 'pythonwin', 'pywin32_system32'}
-
     processed_binaries = []
     for dest_name, src_name, typecode in binaries:
-        dest_path = pathlib.PurePath(dest_name)
-        src_path = pathlib.PurePath(src_name)
-
-        if dest_path.parent == pathlib.PurePath('.') and src_path.parent.name.lower() in PYWIN32_SUBDIRS:
-            dest_path = pathlib.PurePath(src_path.parent.name) / dest_path
-            dest_name = str(dest_path)
-
+        dest_name = _fix_pywin32_dest_name(dest_name, src_name)
+        if anaconda:
+            dest_name = _fix_pywin32_anaconda_dest_name(dest_name)
         processed_binaries.append((dest_name, src_name, typecode))
 
     return processed_binaries
@@ -723,6 +1426,28 @@ def postprocess_binaries_toc_pywin32_anaconda(binaries):
     Process the given `binaries` TOC list to apply work around for Anaconda `pywin32` package, fixing the location
     of collected `pywintypes3X.dll` and `pythoncom3X.dll`.
     """
+    return [(_fix_pywin32_anaconda_dest_name(dest_name), src_name, typecode)
+            for dest_name, src_name, typecode in binaries]
+
+
+def _fix_pywin32_dest_name(dest_name, src_name):
+    # Ensure that all files collected from `win32`  or `pythonwin` into top-level directory are put back into
+    # their corresponding directories. They end up in top-level directory because `pywin32.pth` adds both
+    # directories to the `sys.path`, so they end up visible as top-level directories. But these extensions
+    # might in fact be linked against each other, so we should preserve the directory layout for consistency
+    # between modulegraph-discovered extensions and linked binaries discovered by link-time dependency analysis.
+    # Within the same framework, also consider `pywin32_system32`, just in case.
+    #
+    # NOTE: plain string operations are used instead of `pathlib.PurePath`, as the latter is considerably slower.
+    if os.path.dirname(dest_name) in ('', '.'):
+        src_parent_name = os.path.basename(os.path.dirname(src_name))
+        # Directory names are case-insensitive; try the common spellings first, before resorting to lower-casing.
+        if src_parent_name in _PYWIN32_SUBDIRS_SPELLINGS or src_parent_name.lower() in _PYWIN32_SUBDIRS:
+            dest_name = src_parent_name + os.sep + os.path.basename(dest_name)
+    return dest_name
+
+
+def _fix_pywin32_anaconda_dest_name(dest_name):
     # The Anaconda-provided `pywin32` package installs three copies of `pywintypes3X.dll` and `pythoncom3X.dll`,
     # located in the following directories (relative to the environment):
     # - Library/bin
@@ -733,24 +1458,12 @@ def postprocess_binaries_toc_pywin32_anaconda(binaries):
     # `pywin32` modules are imported and in what order. To keep things simple, we deal with this insanity by
     # post-processing the `binaries` list, modifying the destination of offending copies, and let the final TOC
     # list normalization deal with potential duplicates.
-    DLL_CANDIDATES = {
-        f"pywintypes{sys.version_info[0]}{sys.version_info[1]}.dll",
-        f"pythoncom{sys.version_info[0]}{sys.version_info[1]}.dll",
-    }
-
-    DUPLICATE_DIRS = {
-        pathlib.PurePath('.'),
-        pathlib.PurePath('win32'),
-    }
-
-    processed_binaries = []
-    for dest_name, src_name, typecode in binaries:
-        # Check if we need to divert - based on the destination base name and destination parent directory.
-        dest_path = pathlib.PurePath(dest_name)
-        if dest_path.name.lower() in DLL_CANDIDATES and dest_path.parent in DUPLICATE_DIRS:
-            dest_path = pathlib.PurePath("pywin32_system32") / dest_path.name
-            dest_name = str(dest_path)
-
-        processed_binaries.append((dest_name, src_name, typecode))
-
-    return processed_binaries
+    #
+    # Check if we need to divert - based on the destination base name and destination parent directory.
+    dest_basename = os.path.basename(dest_name)
+    if (
+        dest_basename.lower() in _PYWIN32_DLL_CANDIDATES
+        and os.path.dirname(dest_name).lower() in _PYWIN32_DUPLICATE_DIRS
+    ):
+        dest_name = _PYWIN32_SYS32_PREFIX + dest_basename
+    return dest_name
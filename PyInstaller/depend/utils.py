@@ -76,7 +76,9 @@ def create_py3_base_library(libzip_filename, graph):
                         with io.BytesIO() as fc:
                             fc.write(compat.BYTECODE_MAGIC)
                             fc.write(struct.pack('<I', 0b01))  # PEP-552: hash-based pyc, check_source=False
-                            fc.write(b'\00' * 8)  # Match behavior of `building.utils.compile_pymodule`
+                            # Zero the source hash; unlike `building.utils.compile_pymodule`, which uses the hash to
+                            # decide whether an existing .pyc can be re-used, the base library is always re-created.
+                            fc.write(b'\00' * 8)
                             code = strip_paths_in_code(mod.code)  # Strip paths
                             marshal.dump(code, fc)
                             # Use a ZipInfo to set timestamp for deterministic build.
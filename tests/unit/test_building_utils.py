@@ -9,9 +9,12 @@
 # SPDX-License-Identifier: (GPL-2.0-or-later WITH Bootloader-exception)
 #-----------------------------------------------------------------------------
 
+import errno
 import pytest
 import os
 import pathlib
+import sys
+import types
 from importlib.machinery import EXTENSION_SUFFIXES
 
 from PyInstaller.building import utils
@@ -152,3 +155,431 @@ def test_should_include_system_binary():
         expected = case[3]
 
         assert utils._should_include_system_binary(tuple, excepts) == expected
+
+
+@pytest.mark.skipif(utils.is_darwin, reason="macOS processing requires valid Mach-O binaries.")
+def test_process_collected_binary_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr('PyInstaller.config.CONF', {'cachedir': str(tmpdir.join('cache')), 'upx_dir': None})
+    # Do not actually run `strip`; the file is not a valid binary.
+    monkeypatch.setattr(utils, 'subprocess', types.SimpleNamespace(run=lambda *args, **kwargs: None, DEVNULL=None))
+
+    src_file = tmpdir.join('libtest.so')
+    src_file.write_binary(b'\x00' * 64)
+    src_name = str(src_file)
+
+    cached_name = utils.process_collected_binary(src_name, 'libtest.so', use_strip=True)
+    assert os.path.isfile(cached_name)
+
+    # Unchanged size and modification time; the cached file must be returned without computing the digest.
+    def _fail(filename):
+        raise AssertionError("Digest should not be computed!")
+
+    with monkeypatch.context() as m:
+        m.setattr(utils, '_compute_file_digest', _fail)
+        assert utils.process_collected_binary(src_name, 'libtest.so', use_strip=True) == cached_name
+
+    # Modified file content; the file must be re-processed.
+    src_file.write_binary(b'\x01' * 128)
+    assert utils.process_collected_binary(src_name, 'libtest.so', use_strip=True) == cached_name
+    assert os.path.getsize(cached_name) == 128
+
+
+def test_match_upx_exclude_patterns():
+    # The matching must follow the semantics of `pathlib.PurePath.match`.
+    PATTERNS = ['vcruntime140.dll', 'qt*.dll', 'PyQt5/Qt5/bin/*', '/abs/lib*.so', 'lib/[ab].so']
+    FILENAMES = [
+        'vcruntime140.dll',
+        'some/dir/vcruntime140.dll',
+        'some/dir/vcruntime140_1.dll',
+        'qtcore.dll',
+        'dir/qtgui.dll',
+        'site-packages/PyQt5/Qt5/bin/Qt5Core.dll',
+        'PyQt5/Qt5/lib/Qt5Core.dll',
+        '/abs/libfoo.so',
+        '/other/abs/libfoo.so',
+        'x/lib/a.so',
+        'x/lib/c.so',
+    ]
+
+    for pattern in PATTERNS:
+        compiled_patterns = utils._compile_upx_exclude_patterns((pattern,))
+        for filename in FILENAMES:
+            filename = str(pathlib.PurePath(filename))
+            expected = pattern if pathlib.PurePath(filename).match(pattern) else None
+            assert utils._match_upx_exclude_patterns(filename, compiled_patterns) == expected
+
+
+def test_split_command_arguments(monkeypatch):
+    monkeypatch.setattr(utils, '_MAX_COMMAND_LINE_LENGTH', 100)
+    cmd = ['strip', '-S']
+    files = [f'/some/path/file{i:02d}.so' for i in range(20)]
+
+    batches = list(utils._split_command_arguments(cmd, files))
+    assert len(batches) > 1
+    assert sum(batches, []) == files
+    for batch in batches:
+        assert len(' '.join(cmd + batch)) <= 100
+
+
+def test_get_code_object_cache(tmpdir, monkeypatch):
+    monkeypatch.setitem(utils.CONF, 'cachedir', str(tmpdir.join('cache')))
+
+    src_file = tmpdir.join('mymodule.py')
+    src_file.write('x = 1\n')
+    src_name = str(src_file)
+
+    code = utils.get_code_object('mymodule', src_name)
+    cache_file = utils._get_code_cache_file(src_name, src_name)
+    assert os.path.isfile(cache_file)
+
+    # Unchanged source file; the code object must be retrieved from the cache, without compiling the source.
+    def _fail(*args, **kwargs):
+        raise AssertionError("Source should not be compiled!")
+
+    with monkeypatch.context() as m:
+        m.setattr(utils, 'compile', _fail, raising=False)
+        assert utils.get_code_object('mymodule', src_name) == code
+
+    # Modified source file; the cache entry must not be used.
+    src_file.write('x = 12\n')
+    assert 12 in utils.get_code_object('mymodule', src_name).co_consts
+
+    # Modified source file with unchanged size and modification time; the cache entry must not be used.
+    src_stat = os.stat(src_name)
+    src_file.write('x = 13\n')
+    os.utime(src_name, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    assert 13 in utils.get_code_object('mymodule', src_name).co_consts
+
+    # Relative filenames of source files in different directories must not share the cache entry.
+    for idx in range(2):
+        tmpdir.join(f'dir{idx}', 'main.py').ensure().write(f'x = {idx + 100}\n')
+    for idx in range(2):
+        monkeypatch.chdir(tmpdir.join(f'dir{idx}'))
+        assert idx + 100 in utils.get_code_object('main', 'main.py').co_consts
+
+    # Different optimization level; the cache entry must not be used.
+    cache_file = utils._get_code_cache_file(src_name, src_name)
+    monkeypatch.setattr(utils.sys, 'flags', types.SimpleNamespace(optimize=sys.flags.optimize + 1))
+    assert utils._get_code_cache_file(src_name, src_name) != cache_file
+
+
+def test_strip_paths_in_code(monkeypatch):
+    base_path = os.path.abspath('base')
+    monkeypatch.setitem(utils.CONF, 'pathex', [base_path, os.path.join(base_path, 'lib')])
+
+    src = 'def f():\n    return lambda: 1\n'
+    code = compile(src, os.path.join(base_path, 'lib', 'pkg', 'mod.py'), 'exec')
+
+    stripped_code = utils.strip_paths_in_code(code)
+    # The longest matching path must be stripped, from both the module's code object and the nested ones.
+    expected_filename = os.path.join('pkg', 'mod.py')
+    assert stripped_code.co_filename == expected_filename
+    func_code = next(const for const in stripped_code.co_consts if isinstance(const, type(code)))
+    assert func_code.co_filename == expected_filename
+    # Code objects that already have the expected filename must be left as-is.
+    assert utils.strip_paths_in_code(stripped_code, expected_filename) is stripped_code
+
+    # Code object from a file outside of the search paths must be left as-is.
+    code = compile(src, os.path.join(os.path.abspath('other'), 'mod.py'), 'exec')
+    monkeypatch.setattr(utils.sys, 'path', [])
+    assert utils.strip_paths_in_code(code) is code
+
+
+@pytest.mark.skipif(utils.is_win, reason="Requires symbolic link support.")
+def test_format_binaries_and_datas_directory(tmpdir):
+    def _(path):
+        return os.path.join(*path.split('/'))
+
+    data_dir = tmpdir.join('data')
+    for src in ('a.txt', 'sub/b.txt', 'sub/subsub/c.txt'):
+        data_dir.join(_(src)).ensure()
+    # Symbolic link to file is collected; symbolic link to directory is not followed; broken link is ignored.
+    os.symlink(str(data_dir.join('a.txt')), str(data_dir.join('link.txt')))
+    os.symlink(str(data_dir.join('sub')), str(data_dir.join('linkdir')))
+    os.symlink(str(data_dir.join('missing.txt')), str(data_dir.join('broken.txt')))
+
+    expected = set()
+    for dest, src in (
+        ('trg/a.txt', 'a.txt'),
+        ('trg/link.txt', 'link.txt'),
+        ('trg/sub/b.txt', 'sub/b.txt'),
+        ('trg/sub/subsub/c.txt', 'sub/subsub/c.txt'),
+    ):
+        expected.add((_(dest), str(data_dir.join(_(src)))))
+
+    res = utils.format_binaries_and_datas([('data', 'trg')], str(tmpdir))
+    assert res == expected
+
+
+def test_scandir_mtime_getter(tmpdir):
+    get_mtime = utils._make_scandir_mtime_getter()
+
+    for name in ('a.txt', 'b.txt', 'sub/c.txt'):
+        filename = str(tmpdir.join(name).ensure())
+        assert get_mtime(filename) == utils.misc.mtime(filename)
+
+    # Non-existent files and invalid names behave the same as with `misc.mtime`.
+    assert get_mtime(str(tmpdir.join('missing.txt'))) == 0
+    assert get_mtime(str(tmpdir.join('missing', 'missing.txt'))) == 0
+    assert get_mtime(None) == 0
+
+
+def test_copy_file_contents(tmpdir):
+    src_file = tmpdir.join('src.bin')
+    src_file.write_binary(b'\x00\x01\x02' * 1000)
+    os.chmod(str(src_file), 0o400)
+
+    dest_file = tmpdir.join('dest.bin')
+    utils._copy_file_contents(str(src_file), str(dest_file))
+    assert dest_file.read_binary() == src_file.read_binary()
+    # Permission bits must not be copied; the destination file must remain writable.
+    assert os.access(str(dest_file), os.W_OK)
+
+
+@pytest.mark.skipif(utils.is_darwin, reason="macOS processing requires valid Mach-O binaries.")
+def test_process_collected_binary_content_addressed_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr('PyInstaller.config.CONF', {'cachedir': str(tmpdir.join('cache')), 'upx_dir': None})
+
+    processed_files = []
+
+    def _run(cmd, **kwargs):
+        processed_files.extend(cmd[1:])
+
+    monkeypatch.setattr(utils, 'subprocess', types.SimpleNamespace(run=_run, DEVNULL=None))
+
+    src_file = tmpdir.join('libtest.so')
+    src_file.write_binary(b'\x00' * 64)
+    src_name = str(src_file)
+
+    # The same file collected under different destination names needs to be processed only once.
+    cached_name1 = utils.process_collected_binary(src_name, 'libtest.so', use_strip=True)
+    cached_name2 = utils.process_collected_binary(src_name, os.path.join('subdir', 'libtest.so'), use_strip=True)
+    assert cached_name1 != cached_name2
+    assert processed_files == [cached_name1]
+    with open(cached_name2, 'rb') as fp:
+        assert fp.read() == src_file.read_binary()
+
+    # Once the source file changes and no cached file refers to the old content anymore, its copy is pruned.
+    objects_dir = os.path.join(os.path.dirname(cached_name1), 'objects')
+    old_objects = os.listdir(objects_dir)
+    assert len(old_objects) == 1
+    src_file.write_binary(b'\x01' * 64)
+    utils.process_collected_binary(src_name, 'libtest.so', use_strip=True)
+    assert set(old_objects) < set(os.listdir(objects_dir))
+    utils.process_collected_binary(src_name, os.path.join('subdir', 'libtest.so'), use_strip=True)
+    new_objects = os.listdir(objects_dir)
+    assert len(new_objects) == 1 and new_objects != old_objects
+
+
+def test_compile_pymodule(tmpdir, monkeypatch):
+    monkeypatch.delitem(utils.CONF, 'cachedir', raising=False)
+    src_file = tmpdir.join('src', 'mypackage', 'mymodule.py')
+    src_file.ensure()
+    src_file.write('VALUE = 42\n')
+    workpath = str(tmpdir.join('work'))
+
+    pyc_path = utils.compile_pymodule('mypackage.mymodule', str(src_file), workpath=workpath)
+    assert pyc_path == os.path.join(workpath, 'mypackage', 'mymodule.pyc')
+
+    # Re-compiling from the generated .pyc file must yield equivalent code object.
+    pyc_path2 = utils.compile_pymodule('mymodule', pyc_path, workpath=str(tmpdir.join('work2')))
+    for path in (pyc_path, pyc_path2):
+        with open(path, 'rb') as fp:
+            assert fp.read(4) == utils.compat.BYTECODE_MAGIC
+            fp.seek(16)
+            namespace = {}
+            exec(utils.marshal.load(fp), namespace)
+            assert namespace['VALUE'] == 42
+
+
+def test_compile_pymodules(tmpdir, monkeypatch):
+    monkeypatch.setitem(utils.CONF, 'pathex', [])
+    monkeypatch.delitem(utils.CONF, 'cachedir', raising=False)
+    entries = []
+    for idx in range(10):
+        src_file = tmpdir.join('src', f'module{idx}.py')
+        src_file.ensure()
+        src_file.write(f'VALUE = {idx}\n')
+        entries.append((f'module{idx}', str(src_file)))
+    workpath = str(tmpdir.join('work'))
+
+    pyc_paths = utils.compile_pymodules(entries, workpath=workpath)
+    assert pyc_paths == [os.path.join(workpath, name + '.pyc') for name, _ in entries]
+    for idx, path in enumerate(pyc_paths):
+        with open(path, 'rb') as fp:
+            fp.seek(16)
+            namespace = {}
+            exec(utils.marshal.load(fp), namespace)
+            assert namespace['VALUE'] == idx
+
+
+def test_compile_pymodule_init_in_parent_dir(tmpdir, monkeypatch):
+    monkeypatch.delitem(utils.CONF, 'cachedir', raising=False)
+    # A `__init__` in the name of a parent directory must not cause the module to be treated as a package.
+    src_file = tmpdir.join('src', '__init__dir', 'mymodule.py')
+    src_file.ensure()
+    workpath = str(tmpdir.join('work'))
+
+    pyc_path = utils.compile_pymodule('mymodule', str(src_file), workpath=workpath)
+    assert pyc_path == os.path.join(workpath, 'mymodule.pyc')
+
+
+def test_compile_pymodule_reuse(tmpdir, monkeypatch):
+    monkeypatch.delitem(utils.CONF, 'cachedir', raising=False)
+    src_file = tmpdir.join('mymodule.py')
+    src_file.write('VALUE = 1\n')
+    workpath = str(tmpdir.join('work'))
+
+    pyc_path = utils.compile_pymodule('mymodule', str(src_file), workpath=workpath)
+    with open(pyc_path, 'rb') as fp:
+        pyc_data = fp.read()
+    assert pyc_data[8:16] == utils.importlib.util.source_hash(src_file.read_binary())
+
+    # Unchanged source; the existing .pyc file is re-used.
+    os.utime(pyc_path, ns=(0, 0))
+    assert utils.compile_pymodule('mymodule', str(src_file), workpath=workpath) == pyc_path
+    assert os.stat(pyc_path).st_mtime_ns == 0
+
+    # Modified source; the .pyc file is re-generated regardless of modification times.
+    src_file.write('VALUE = 2\n')
+    os.utime(str(src_file), ns=(0, 0))
+    assert utils.compile_pymodule('mymodule', str(src_file), workpath=workpath) == pyc_path
+    with open(pyc_path, 'rb') as fp:
+        assert fp.read() != pyc_data
+
+
+def test_postprocess_binaries_toc_pywin32():
+    site_packages = os.path.join(os.sep, 'python', 'Lib', 'site-packages')
+    binaries = [
+        ('win32api.pyd', os.path.join(site_packages, 'win32', 'win32api.pyd'), 'EXTENSION'),
+        ('win32ui.pyd', os.path.join(site_packages, 'Pythonwin', 'win32ui.pyd'), 'EXTENSION'),
+        (os.path.join('mypackage', 'mylib.dll'), os.path.join(site_packages, 'win32', 'mylib.dll'), 'BINARY'),
+        ('other.dll', os.path.join(site_packages, 'other', 'other.dll'), 'BINARY'),
+    ]
+    assert [dest_name for dest_name, *_ in utils.postprocess_binaries_toc_pywin32(binaries)] == [
+        os.path.join('win32', 'win32api.pyd'),
+        os.path.join('Pythonwin', 'win32ui.pyd'),
+        os.path.join('mypackage', 'mylib.dll'),
+        'other.dll',
+    ]
+
+
+def test_postprocess_binaries_toc_pywin32_anaconda():
+    dll_name = 'pywintypes{}{}.dll'.format(*utils.sys.version_info[:2])
+    binaries = [
+        (dll_name, dll_name, 'BINARY'),
+        (os.path.join('win32', dll_name), dll_name, 'BINARY'),
+        (os.path.join('mypackage', dll_name), dll_name, 'BINARY'),
+        ('other.dll', 'other.dll', 'BINARY'),
+    ]
+    assert [dest_name for dest_name, *_ in utils.postprocess_binaries_toc_pywin32_anaconda(binaries)] == [
+        os.path.join('pywin32_system32', dll_name),
+        os.path.join('pywin32_system32', dll_name),
+        os.path.join('mypackage', dll_name),
+        'other.dll',
+    ]
+
+
+def test_compile_pymodule_persistent_cache(tmpdir, monkeypatch):
+    monkeypatch.setitem(utils.CONF, 'cachedir', str(tmpdir.join('cache')))
+    src_file = tmpdir.join('mymodule.py')
+    src_file.write('VALUE = 1\n')
+
+    pyc_path1 = utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work1')))
+    cache_file = utils._get_pymodule_cache_file(str(src_file))
+    assert os.path.isfile(cache_file)
+
+    # Compiling the same module in another workpath re-uses the cached module.
+    pyc_path2 = utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work2')))
+    assert os.path.samefile(pyc_path1, cache_file)
+    assert os.path.samefile(pyc_path2, cache_file)
+
+    # If hard links are not supported, the cached module is copied, with the same permission bits as when the .pyc file
+    # is written by `compile_pymodule` itself.
+    def _link(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    with monkeypatch.context() as m:
+        m.setattr(utils.os, 'link', _link)
+        pyc_path3 = utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work3')))
+    assert not os.path.samefile(pyc_path3, cache_file)
+    assert os.stat(pyc_path3).st_mode == os.stat(pyc_path1).st_mode
+
+    # Different optimization level; the cache entry must not be used.
+    with monkeypatch.context() as m:
+        m.setattr(utils.sys, 'flags', types.SimpleNamespace(optimize=sys.flags.optimize + 1))
+        assert utils._get_pymodule_cache_file(str(src_file)) != cache_file
+
+    # Re-compiling a modified module must not modify the existing cache entry in place, as it might be hard-linked.
+    with open(cache_file, 'rb') as fp:
+        cached_data = fp.read()
+    src_file.write('VALUE = 2\n')
+    utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work2')))
+    with open(pyc_path1, 'rb') as fp:
+        assert fp.read() == cached_data
+    assert os.path.samefile(pyc_path2, cache_file)
+
+    # Modified source with unchanged size and modification time; the cache entry must not be used.
+    src_stat = os.stat(str(src_file))
+    src_file.write('VALUE = 3\n')
+    os.utime(str(src_file), ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    pyc_path4 = utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work4')))
+    with open(pyc_path4, 'rb') as fp:
+        assert fp.read()[8:16] == utils.importlib.util.source_hash(b'VALUE = 3\n')
+
+
+def test_prune_cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(utils, '_pruned_cache_dirs', set())
+    cache_dir = tmpdir.join('cache')
+    old_entry = cache_dir.join('ab', 'old')
+    new_entry = cache_dir.join('cd', 'new')
+    old_entry.ensure()
+    new_entry.ensure()
+    os.utime(str(old_entry), (0, 0))
+
+    utils._prune_cache_dir(str(cache_dir))
+    assert not old_entry.exists()
+    assert new_entry.exists()
+
+    # Pruning is performed at most once per interval.
+    monkeypatch.setattr(utils, '_pruned_cache_dirs', set())
+    new_entry.ensure()
+    os.utime(str(new_entry), (0, 0))
+    utils._prune_cache_dir(str(cache_dir))
+    assert new_entry.exists()
+
+
+def test_ensure_pyc_dirs(tmpdir):
+    entries = [
+        ('mypackage', os.path.join('src', 'mypackage', '__init__.py')),
+        ('mypackage.mymodule', os.path.join('src', 'mypackage', 'mymodule.py')),
+        ('mypackage.subpackage.mymodule', os.path.join('src', 'mypackage', 'subpackage', 'mymodule.py')),
+    ]
+    utils.ensure_pyc_dirs(entries, str(tmpdir))
+    assert tmpdir.join('mypackage', 'subpackage').isdir()
+    assert not tmpdir.join('mypackage', 'mymodule').exists()
+
+
+def test_compile_pymodule_incompatible_pyc(tmpdir, monkeypatch):
+    monkeypatch.delitem(utils.CONF, 'cachedir', raising=False)
+    src_file = tmpdir.join('mymodule.pyc')
+    src_file.write_binary(b'\x00' * 16 + b'invalid')
+    with pytest.raises(ValueError, match='incompatible version of python'):
+        utils.compile_pymodule('mymodule', str(src_file), workpath=str(tmpdir.join('work')))
+
+
+def test_postprocess_binaries_toc_pywin32_with_anaconda():
+    # With both work-arounds applied in the same pass, DLLs from `win32` directory are diverted to `pywin32_system32`,
+    # as if the Anaconda work-around was applied after the generic one.
+    dll_name = 'pythoncom{}{}.dll'.format(*utils.sys.version_info[:2])
+    site_packages = os.path.join(os.sep, 'python', 'Lib', 'site-packages')
+    binaries = [
+        (dll_name, os.path.join(site_packages, 'win32', dll_name), 'BINARY'),
+        ('win32api.pyd', os.path.join(site_packages, 'win32', 'win32api.pyd'), 'EXTENSION'),
+    ]
+    expected = utils.postprocess_binaries_toc_pywin32_anaconda(utils.postprocess_binaries_toc_pywin32(binaries))
+    assert utils.postprocess_binaries_toc_pywin32(binaries, anaconda=True) == expected
+    assert [dest_name for dest_name, *_ in expected] == [
+        os.path.join('pywin32_system32', dll_name),
+        os.path.join('win32', 'win32api.pyd'),
+    ]